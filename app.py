@@ -1,162 +1,229 @@
+import multiprocessing
 import sqlite3
+import time
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
-from datetime import datetime, timedelta
-from apscheduler.schedulers.background import BackgroundScheduler
-import random
+from plotly.colors import qualitative
+
+from db import DB_PATH, get_conn, init_db, now_str, transaction
 
 # --- Database Setup ---
-def init_db():
-    conn = sqlite3.connect('business_data.db')
-    c = conn.cursor()
-    # Sales table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS sales (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sale_date TEXT,
-            product TEXT,
-            quantity INTEGER,
-            total_selling_price REAL,
-            total_buying_price REAL,
-            revenue REAL,
-            customer_id INTEGER
-        )
-    ''')
-    # Inventory table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS inventory (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product TEXT,
-            stock INTEGER CHECK(stock >= 0),
-            last_updated TEXT
-        )
-    ''')
-    # Customers table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS customers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            email TEXT UNIQUE,
-            orders INTEGER,
-            is_active INTEGER
-        )
-    ''')
-    conn.commit()
-    conn.close()
+@st.cache_resource(show_spinner=False)
+def _ensure_schema():
+    init_db()
+    return True
+
+def _sales_empty():
+    # O(1) probe instead of materializing the whole table into a DataFrame
+    return get_conn().execute('SELECT 1 FROM sales LIMIT 1').fetchone() is None
 
 # --- Data Fetching ---
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_sales_data():
     try:
-        conn = sqlite3.connect('business_data.db')
-        df = pd.read_sql_query('SELECT * FROM sales', conn)
-        conn.close()
+        # Typed read: category codes for product, narrow numerics, dates parsed once in C.
+        # Columns are named explicitly (no unused id) to keep cursor rows small
+        df = pd.read_sql_query(
+            'SELECT sale_date, product, quantity, total_selling_price, total_buying_price, revenue, customer_id FROM sales',
+            get_conn(),
+            parse_dates=['sale_date'],
+            dtype={'product': 'category', 'quantity': 'int32', 'customer_id': 'int32',
+                   'total_selling_price': 'float32', 'total_buying_price': 'float32',
+                   'revenue': 'float32'})
         return df
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
         return pd.DataFrame()
 
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_inventory_data():
     try:
-        conn = sqlite3.connect('business_data.db')
-        df = pd.read_sql_query('SELECT * FROM inventory', conn)
-        conn.close()
+        df = pd.read_sql_query('SELECT product, stock, last_updated FROM inventory', get_conn())
         return df
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
         return pd.DataFrame()
 
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_customer_data():
     try:
-        conn = sqlite3.connect('business_data.db')
-        df = pd.read_sql_query('SELECT * FROM customers', conn)
-        conn.close()
+        df = pd.read_sql_query('SELECT id, name, email, orders, is_active FROM customers', get_conn())
         return df
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
         return pd.DataFrame()
 
 # --- Metrics Calculation ---
-def compute_metrics(sales_df, customer_df):
-    total_customers = len(customer_df)
-    active_customers = len(customer_df[customer_df['is_active'] == 1])
+@st.cache_data(ttl=60, show_spinner=False)
+def compute_metrics():
+    # Aggregate in SQL so only six scalars cross the cursor instead of every row
+    try:
+        conn = get_conn()
+        total_revenue, avg_order_value, total_quantity, total_selling = conn.execute(
+            'SELECT SUM(revenue), AVG(total_selling_price), SUM(quantity), SUM(total_selling_price) FROM sales').fetchone()
+        total_customers, active_customers = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(is_active), 0) FROM customers').fetchone()
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+        total_revenue = avg_order_value = total_quantity = total_selling = None
+        total_customers = active_customers = 0
     churn_rate = ((total_customers - active_customers) / total_customers * 100) if total_customers > 0 else 0
     metrics = {
-        'total_revenue': sales_df['revenue'].sum(),
-        'avg_order_value': sales_df['total_selling_price'].mean() if not sales_df.empty else 0,
-        'total_quantity': sales_df['quantity'].sum(),
+        'total_revenue': total_revenue or 0,
+        'avg_order_value': avg_order_value or 0,
+        'total_quantity': total_quantity or 0,
         'churn_rate': churn_rate,
         'total_customers': total_customers,
-        'profit_margin': (sales_df['revenue'].sum() / sales_df['total_selling_price'].sum() * 100) if sales_df['total_selling_price'].sum() > 0 else 0
+        'profit_margin': (total_revenue / total_selling * 100) if total_selling else 0
     }
     return metrics
 
 # --- Visualizations ---
-def create_visualizations(sales_df, inventory_df, customer_df):
-    # Sales by Product (Bar Chart)
-    fig1 = px.bar(sales_df, x='product', y='revenue', title='Revenue by Product', color='product')
-    
-    # Weekly Revenue Trend (Line Chart)
-    sales_df['sale_date'] = pd.to_datetime(sales_df['sale_date'])
-    sales_df['week'] = sales_df['sale_date'].dt.isocalendar().week
-    weekly_revenue = sales_df.groupby('week')['revenue'].sum().reset_index()
-    fig2 = px.line(weekly_revenue, x='week', y='revenue', title='Weekly Revenue Trend', markers=True)
-    
-    # Inventory Levels (Bar Chart)
-    fig3 = px.bar(inventory_df, x='product', y='stock', title='Inventory Levels', color='product')
-    
+# Each figure is cached separately, keyed only by its own (tiny, pre-aggregated)
+# input, so one changed slice doesn't rebuild the other three charts.
+# Figures are assembled with graph_objects on plain arrays, skipping Plotly
+# Express's per-call DataFrame introspection.
+def _bar_colors(n):
+    palette = qualitative.Plotly
+    return [palette[i % len(palette)] for i in range(n)]
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fig_revenue_by_product(product_revenue):
+    fig = go.Figure(go.Bar(x=product_revenue['product'].to_numpy(),
+                           y=product_revenue['revenue'].to_numpy(),
+                           marker_color=_bar_colors(len(product_revenue))))
+    fig.update_layout(title='Revenue by Product', xaxis_title='product', yaxis_title='revenue')
+    return fig
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fig_weekly_revenue(weekly_revenue):
+    fig = go.Figure(go.Scatter(x=weekly_revenue['week'].to_numpy(),
+                               y=weekly_revenue['revenue'].to_numpy(),
+                               mode='lines+markers'))
+    fig.update_layout(title='Weekly Revenue Trend', xaxis_title='week', yaxis_title='revenue')
+    return fig
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fig_inventory_levels(inventory_df):
+    fig = go.Figure(go.Bar(x=inventory_df['product'].to_numpy(),
+                           y=inventory_df['stock'].to_numpy(),
+                           marker_color=_bar_colors(len(inventory_df))))
+    fig.update_layout(title='Inventory Levels', xaxis_title='product', yaxis_title='stock')
+    return fig
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fig_customer_churn(churn_counts):
+    fig = go.Figure(go.Pie(labels=churn_counts['status'].to_numpy(),
+                           values=churn_counts['count'].to_numpy()))
+    fig.update_layout(title='Customer Churn Status')
+    return fig
+
+def create_visualizations(inventory_df, customer_df):
+    conn = get_conn()
+    # Sales by Product (Bar Chart) - read from the trigger-maintained rollup
+    product_revenue = pd.read_sql_query(
+        'SELECT product, total_revenue AS revenue FROM sales_by_product ORDER BY product', conn)
+
+    # Weekly Revenue Trend (Line Chart) - read from the trigger-maintained rollup
+    weekly_revenue = pd.read_sql_query(
+        'SELECT week, total_revenue AS revenue FROM sales_by_week ORDER BY week', conn)
+
     # Customer Churn (Pie Chart)
     churn_counts = customer_df['is_active'].value_counts().reset_index()
     churn_counts['status'] = churn_counts['is_active'].map({1: 'Active', 0: 'Churned'})
-    fig4 = px.pie(churn_counts, values='count', names='status', title='Customer Churn Status')
-    
-    return fig1, fig2, fig3, fig4
+
+    return (fig_revenue_by_product(product_revenue),
+            fig_weekly_revenue(weekly_revenue),
+            fig_inventory_levels(inventory_df),
+            fig_customer_churn(churn_counts))
 
 # --- Automation (Optional Sample Data) ---
+def _generate_sample_rows(conn):
+    products = ['Phone', 'Tablet', 'TV', 'Appliance']
+    n = len(products)
+    sale_date = now_str()
+    # Draw all random values in one vectorized pass
+    rng = np.random.default_rng()
+    quantity = rng.integers(1, 21, size=n)  # inventory starts at 100 units
+    selling_price = rng.uniform(5000, 50000, size=n)
+    buying_price = selling_price * rng.uniform(0.6, 0.8, size=n)
+    total_selling_price = quantity * selling_price
+    total_buying_price = quantity * buying_price
+    revenue = total_selling_price - total_buying_price
+    customer_id = rng.integers(1, 11, size=n)
+    sale_rows = list(zip([sale_date] * n, products, quantity.tolist(),
+                         total_selling_price.tolist(), total_buying_price.tolist(),
+                         revenue.tolist(), customer_id.tolist()))
+    with transaction(conn):
+        # Seed the sample customers the generated sales reference, so the
+        # foreign key on sales.customer_id is satisfied on a fresh database
+        conn.executemany('INSERT OR IGNORE INTO customers (id, name, email, orders, is_active) VALUES (?, ?, ?, 0, 1)',
+                         [(i, f'Sample Customer {i}', f'sample{i}@example.com') for i in range(1, 11)])
+        # Initialize inventory with sufficient stock (100 units each)
+        conn.executemany('INSERT OR REPLACE INTO inventory (product, stock, last_updated) VALUES (?, ?, ?)',
+                         [(product, 100, sale_date) for product in products])
+        conn.executemany('INSERT INTO sales (sale_date, product, quantity, total_selling_price, total_buying_price, revenue, customer_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         sale_rows)
+        conn.executemany('UPDATE inventory SET stock = stock - ?, last_updated = ? WHERE product = ?',
+                         list(zip(quantity.tolist(), [sale_date] * n, products)))
+
 def generate_sample_data():
     try:
-        products = ['Phone', 'Tablet', 'TV', 'Appliance']
-        sale_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        conn = sqlite3.connect('business_data.db')
-        c = conn.cursor()
-        for product in products:
-            # Initialize inventory with sufficient stock
-            c.execute('INSERT OR REPLACE INTO inventory (product, stock, last_updated) VALUES (?, ?, ?)',
-                      (product, 100, sale_date))  # Start with 100 units
-            # Generate sale within stock limits
-            c.execute('SELECT stock FROM inventory WHERE product = ?', (product,))
-            stock = c.fetchone()[0]
-            quantity = random.randint(1, min(stock, 20))
-            selling_price = random.uniform(5000, 50000)
-            buying_price = selling_price * random.uniform(0.6, 0.8)
-            total_selling_price = quantity * selling_price
-            total_buying_price = quantity * buying_price
-            revenue = total_selling_price - total_buying_price
-            customer_id = random.randint(1, 10)
-            c.execute('INSERT INTO sales (sale_date, product, quantity, total_selling_price, total_buying_price, revenue, customer_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                      (sale_date, product, quantity, total_selling_price, total_buying_price, revenue, customer_id))
-            c.execute('UPDATE inventory SET stock = stock - ?, last_updated = ? WHERE product = ?',
-                      (quantity, sale_date, product))
-        conn.commit()
-        conn.close()
+        conn = get_conn()
+        _generate_sample_rows(conn)
+        # Invalidate cached reads now that the tables changed - including the
+        # business page's own cached fetchers, which are distinct functions
+        # when both pages run in one process under main_app.py
+        fetch_sales_data.clear()
+        fetch_inventory_data.clear()
+        fetch_customer_data.clear()
+        compute_metrics.clear()
+        # Imported lazily to keep the standalone analytics page decoupled
+        import business_app
+        business_app.fetch_sales_data.clear()
+        business_app.fetch_inventory_data.clear()
+        business_app.fetch_customers.clear()
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
 
+def _generator_daemon():
+    # Runs in its own process with a dedicated write connection, so the daily
+    # refresh never blocks the Streamlit server; readers keep going during its
+    # writes thanks to WAL mode, and the UI sees the new rows once the 60s
+    # caches expire
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute('PRAGMA busy_timeout=5000')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    while True:
+        time.sleep(86400)
+        try:
+            _generate_sample_rows(conn)
+        except sqlite3.Error:
+            pass  # transaction() already rolled back; retry next tick
+
+@st.cache_resource(show_spinner=False)
 def schedule_data_update():
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(generate_sample_data, 'interval', hours=24)
-    scheduler.start()
+    # One writer-only daemon per server process; st.cache_resource guarantees
+    # it isn't duplicated by reruns or by main_app importing this module
+    process = multiprocessing.Process(target=_generator_daemon, daemon=True)
+    process.start()
+    return process
 
 # --- Streamlit Interface ---
 def main():
     # No st.set_page_config()
     st.title("📊 E-Commerce Analytics Dashboard")
-    st.title("Analytics Dashboard")
-    # Initialize database
-    init_db()
+    # Initialize database (cached, so reruns skip the CREATE statements)
+    _ensure_schema()
+
+    # Schedule the daily sample-data refresh (no-op after the first rerun)
+    schedule_data_update()
     
     # Generate sample data if none exists
-    if len(fetch_sales_data()) == 0:
+    if _sales_empty():
         generate_sample_data()
     
     # Fetch data
@@ -165,7 +232,7 @@ def main():
     customer_df = fetch_customer_data()
     
     # Compute metrics
-    metrics = compute_metrics(sales_df, customer_df)
+    metrics = compute_metrics()
     
     # Display metrics
     st.subheader("📈 Key Performance Indicators")
@@ -210,7 +277,7 @@ def main():
     st.subheader("📊 Visual Analytics")
     # First row: Sales by Product, Weekly Revenue Trend, Inventory Levels
     col1, col2, col3 = st.columns(3)
-    fig1, fig2, fig3, fig4 = create_visualizations(sales_df, inventory_df, customer_df)
+    fig1, fig2, fig3, fig4 = create_visualizations(inventory_df, customer_df)
     with col1:
         st.plotly_chart(fig1, use_container_width=True, key="analytics_sales_by_product")
     with col2:
@@ -224,5 +291,4 @@ def main():
         st.plotly_chart(fig4, use_container_width=True, key="analytics_customer_churn")
 
 if __name__ == "__main__":
-    schedule_data_update()
     main()
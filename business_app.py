@@ -1,88 +1,61 @@
+import os
 import sqlite3
 import streamlit as st
+import numpy as np
 import pandas as pd
-from datetime import datetime
-import random
+from concurrent.futures import ThreadPoolExecutor
+
+from db import get_conn, init_db, now_str, transaction
+
+class _SaleRejected(Exception):
+    """Raised inside a sale transaction to roll it back with a user message."""
 
 # --- Database Functions ---
-def init_db():
-    conn = sqlite3.connect('business_data.db')
-    c = conn.cursor()
-    # Sales table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS sales (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sale_date TEXT,
-            product TEXT,
-            quantity INTEGER,
-            total_selling_price REAL,
-            total_buying_price REAL,
-            revenue REAL,
-            customer_id INTEGER
-        )
-    ''')
-    # Inventory table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS inventory (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product TEXT,
-            stock INTEGER CHECK(stock >= 0),  -- Prevent negative stock
-            last_updated TEXT
-        )
-    ''')
-    # Customers table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS customers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            email TEXT UNIQUE,
-            orders INTEGER,
-            is_active INTEGER
-        )
-    ''')
-    conn.commit()
-    conn.close()
+@st.cache_resource(show_spinner=False)
+def _ensure_schema():
+    init_db()
+    return True
 
-def add_sale(product, quantity, selling_price, buying_price, customer_id):
+def add_sale(product, quantity, selling_price, buying_price, customer_id, conn=None):
     try:
-        conn = sqlite3.connect('business_data.db')
-        c = conn.cursor()
-        # Validate customer_id exists
-        c.execute('SELECT id FROM customers WHERE id = ?', (customer_id,))
-        if not c.fetchone():
-            st.error(f"Customer ID {customer_id} does not exist.")
-            conn.close()
-            return False
-        # Validate product exists and has sufficient stock
-        c.execute('SELECT stock FROM inventory WHERE product = ?', (product,))
-        stock_result = c.fetchone()
-        if not stock_result:
-            st.error(f"Product {product} not found in inventory.")
-            conn.close()
-            return False
-        current_stock = stock_result[0]
-        if current_stock < quantity:
-            st.error(f"Insufficient stock for {product}. Available: {current_stock}, Requested: {quantity}")
-            conn.close()
-            return False
-        # Proceed with sale
-        sale_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Callers holding a connection (e.g. their own transaction scope) can
+        # pass it in; everyone else shares the module singleton
+        if conn is None:
+            conn = get_conn()
+        sale_date = now_str()
         total_selling_price = quantity * selling_price
         total_buying_price = quantity * buying_price
         revenue = total_selling_price - total_buying_price
-        c.execute('INSERT INTO sales (sale_date, product, quantity, total_selling_price, total_buying_price, revenue, customer_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                  (sale_date, product, quantity, total_selling_price, total_buying_price, revenue, customer_id))
-        # Update inventory stock
-        c.execute('UPDATE inventory SET stock = stock - ?, last_updated = ? WHERE product = ?',
-                  (quantity, sale_date, product))
-        # Increment customer orders
-        c.execute('UPDATE customers SET orders = orders + 1 WHERE id = ?', (customer_id,))
-        conn.commit()
-        conn.close()
+        with transaction(conn):
+            c = conn.cursor()
+            # Check the customer explicitly rather than leaning on the foreign
+            # key: databases created before the FK existed keep their original
+            # sales schema, so the constraint is not there to catch this
+            if not c.execute('SELECT 1 FROM customers WHERE id = ?', (customer_id,)).fetchone():
+                raise _SaleRejected(f"Customer ID {customer_id} does not exist.")
+            # Check-and-decrement stock in one atomic statement; rowcount == 0
+            # means the product is missing or the stock is insufficient
+            c.execute('UPDATE inventory SET stock = stock - ?, last_updated = ? WHERE product = ? AND stock >= ?',
+                      (quantity, sale_date, product, quantity))
+            if c.rowcount == 0:
+                stock_result = c.execute('SELECT stock FROM inventory WHERE product = ?', (product,)).fetchone()
+                if not stock_result:
+                    raise _SaleRejected(f"Product {product} not found in inventory.")
+                raise _SaleRejected(f"Insufficient stock for {product}. Available: {stock_result[0]}, Requested: {quantity}")
+            c.execute('INSERT INTO sales (sale_date, product, quantity, total_selling_price, total_buying_price, revenue, customer_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                      (sale_date, product, quantity, total_selling_price, total_buying_price, revenue, customer_id))
+            # Increment customer orders
+            c.execute('UPDATE customers SET orders = orders + 1 WHERE id = ?', (customer_id,))
+        _clear_cached_data()
         return True
+    except _SaleRejected as e:
+        st.error(str(e))
+        return False
+    except sqlite3.IntegrityError:
+        st.error(f"Customer ID {customer_id} does not exist.")
+        return False
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
-        conn.close()
         return False
 
 def add_inventory(product, stock, last_updated=None):
@@ -91,13 +64,11 @@ def add_inventory(product, stock, last_updated=None):
             st.error(f"Stock for {product} cannot be negative.")
             return False
         if last_updated is None:
-            last_updated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        conn = sqlite3.connect('business_data.db')
-        c = conn.cursor()
-        c.execute('INSERT OR REPLACE INTO inventory (product, stock, last_updated) VALUES (?, ?, ?)',
-                  (product, stock, last_updated))
-        conn.commit()
-        conn.close()
+            last_updated = now_str()
+        with transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO inventory (product, stock, last_updated) VALUES (?, ?, ?)',
+                         (product, stock, last_updated))
+        _clear_cached_data()
         return True
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
@@ -105,62 +76,214 @@ def add_inventory(product, stock, last_updated=None):
 
 def add_customer(name, email, orders=0, is_active=1):
     try:
-        conn = sqlite3.connect('business_data.db')
-        c = conn.cursor()
-        # Check if email already exists
-        c.execute('SELECT email FROM customers WHERE email = ?', (email,))
-        if c.fetchone():
-            st.error(f"Customer with email {email} already exists.")
-            conn.close()
-            return None
-        # Add new customer
-        c.execute('INSERT INTO customers (name, email, orders, is_active) VALUES (?, ?, ?, ?)',
-                  (name, email, orders, is_active))
-        conn.commit()
-        customer_id = c.lastrowid
-        conn.close()
+        with transaction() as conn:
+            c = conn.cursor()
+            # Check if email already exists
+            c.execute('SELECT email FROM customers WHERE email = ?', (email,))
+            if c.fetchone():
+                st.error(f"Customer with email {email} already exists.")
+                return None
+            # Add new customer
+            c.execute('INSERT INTO customers (name, email, orders, is_active) VALUES (?, ?, ?, ?)',
+                      (name, email, orders, is_active))
+            customer_id = c.lastrowid
+        _clear_cached_data()
         return customer_id
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
         return None
 
+def _validate_sales_chunk(chunk):
+    # Coerce one slice of the upload to insert-ready types and derive the
+    # price/revenue columns; raises ValueError on malformed rows
+    quantities = pd.to_numeric(chunk['quantity']).astype('int64')
+    if (quantities <= 0).any():
+        raise ValueError("quantity must be a positive integer")
+    selling = pd.to_numeric(chunk['selling_price']).astype('float64')
+    buying = pd.to_numeric(chunk['buying_price']).astype('float64')
+    customer_ids = pd.to_numeric(chunk['customer_id']).astype('int64')
+    total_selling = quantities * selling
+    total_buying = quantities * buying
+    revenue = total_selling - total_buying
+    return list(zip(chunk['product'].astype(str).tolist(), quantities.tolist(),
+                    total_selling.tolist(), total_buying.tolist(), revenue.tolist(),
+                    customer_ids.tolist()))
+
+def bulk_add_sales(df):
+    try:
+        if df.empty:
+            return True
+        conn = get_conn()
+        sale_date = now_str()
+        # Validate stock for the whole batch in one query
+        needed = df.groupby('product')['quantity'].sum()
+        products = list(needed.index)
+        placeholders = ','.join('?' * len(products))
+        stock = dict(conn.execute(f'SELECT product, stock FROM inventory WHERE product IN ({placeholders})', products).fetchall())
+        for product, qty in needed.items():
+            if product not in stock:
+                st.error(f"Product {product} not found in inventory.")
+                return False
+            if stock[product] < qty:
+                st.error(f"Insufficient stock for {product}. Available: {stock[product]}, Requested: {int(qty)}")
+                return False
+        # Validate customer ids in one query
+        order_counts = df['customer_id'].value_counts()
+        customer_ids = [int(cid) for cid in order_counts.index]
+        placeholders = ','.join('?' * len(customer_ids))
+        known = {row[0] for row in conn.execute(f'SELECT id FROM customers WHERE id IN ({placeholders})', customer_ids)}
+        missing = sorted(set(customer_ids) - known)
+        if missing:
+            st.error(f"Customer ID {missing[0]} does not exist.")
+            return False
+        # Validate and coerce chunks in parallel, then write from this thread only
+        n_chunks = max(1, min(len(df), os.cpu_count() or 1))
+        bounds = np.linspace(0, len(df), n_chunks + 1, dtype=int)
+        chunks = [df.iloc[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+        with ThreadPoolExecutor() as ex:
+            validated = list(ex.map(_validate_sales_chunk, chunks))
+        rows = [(sale_date,) + row for chunk_rows in validated for row in chunk_rows]
+        with transaction(conn):
+            conn.executemany('INSERT INTO sales (sale_date, product, quantity, total_selling_price, total_buying_price, revenue, customer_id) VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            conn.executemany('UPDATE inventory SET stock = stock - ?, last_updated = ? WHERE product = ?',
+                             [(int(qty), sale_date, product) for product, qty in needed.items()])
+            conn.executemany('UPDATE customers SET orders = orders + ? WHERE id = ?',
+                             [(int(n), int(cid)) for cid, n in order_counts.items()])
+        _clear_cached_data()
+        return True
+    except (ValueError, TypeError) as e:
+        st.error(f"Invalid sales CSV: {e}")
+        return False
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+        return False
+
+def bulk_add_inventory(df):
+    try:
+        conn = get_conn()
+        stocks = df['stock'].to_numpy()
+        if (stocks < 0).any():
+            product = df['product'].iloc[int((stocks < 0).argmax())]
+            st.error(f"Stock for {product} cannot be negative.")
+            return False
+        rows = list(zip(df['product'].tolist(), df['stock'].tolist(), df['last_updated'].tolist()))
+        with transaction(conn):
+            conn.executemany('INSERT OR REPLACE INTO inventory (product, stock, last_updated) VALUES (?, ?, ?)', rows)
+        _clear_cached_data()
+        return True
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+        return False
+
+def bulk_add_customers(df):
+    try:
+        if df.empty:
+            return 0
+        conn = get_conn()
+        emails = df['email'].tolist()
+        placeholders = ','.join('?' * len(emails))
+        existing = [row[0] for row in conn.execute(f'SELECT email FROM customers WHERE email IN ({placeholders})', emails)]
+        if existing:
+            st.error(f"Customer with email {existing[0]} already exists.")
+            return None
+        rows = list(zip(df['name'].tolist(), emails, df['orders'].tolist(), df['is_active'].tolist()))
+        with transaction(conn):
+            conn.executemany('INSERT INTO customers (name, email, orders, is_active) VALUES (?, ?, ?, ?)', rows)
+        _clear_cached_data()
+        return len(rows)
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+        return None
+
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_sales_data():
     try:
-        conn = sqlite3.connect('business_data.db')
-        df = pd.read_sql_query('SELECT * FROM sales', conn)
-        conn.close()
+        df = pd.read_sql_query('SELECT sale_date, product, quantity, total_selling_price, total_buying_price, revenue, customer_id FROM sales', get_conn())
         return df
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
         return pd.DataFrame()
 
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_inventory_data():
     try:
-        conn = sqlite3.connect('business_data.db')
-        df = pd.read_sql_query('SELECT * FROM inventory', conn)
-        conn.close()
+        df = pd.read_sql_query('SELECT product, stock, last_updated FROM inventory', get_conn())
         return df
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
         return pd.DataFrame()
 
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_customers():
     try:
-        conn = sqlite3.connect('business_data.db')
-        df = pd.read_sql_query('SELECT * FROM customers', conn)
-        conn.close()
+        df = pd.read_sql_query('SELECT id, name, email, orders, is_active FROM customers', get_conn())
         return df
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
         return pd.DataFrame()
 
+def simulate_daily_sales():
+    try:
+        conn = get_conn()
+        inventory = conn.execute('SELECT product, stock FROM inventory').fetchall()
+        for product, stock in inventory:
+            if stock <= 0:
+                st.warning(f"Skipping {product}: No stock available.")
+        in_stock = [(product, stock) for product, stock in inventory if stock > 0]
+        if not in_stock:
+            return False
+        customer_pool = [row[0] for row in conn.execute('SELECT id FROM customers')]
+        if not customer_pool:
+            st.error("No customers exist to attribute simulated sales to.")
+            return False
+        products = [row[0] for row in in_stock]
+        stocks = np.array([row[1] for row in in_stock])
+        n = len(products)
+        sale_date = now_str()
+        # One vectorized draw for every product instead of per-product scalars
+        rng = np.random.default_rng()
+        quantity = rng.integers(1, np.minimum(stocks, 10) + 1)  # limit to available stock
+        selling_price = rng.uniform(5000, 50000, size=n)
+        buying_price = selling_price * rng.uniform(0.6, 0.8, size=n)
+        total_selling_price = quantity * selling_price
+        total_buying_price = quantity * buying_price
+        revenue = total_selling_price - total_buying_price
+        customer_id = rng.choice(customer_pool, size=n)
+        with transaction(conn):
+            conn.executemany('INSERT INTO sales (sale_date, product, quantity, total_selling_price, total_buying_price, revenue, customer_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             list(zip([sale_date] * n, products, quantity.tolist(),
+                                      total_selling_price.tolist(), total_buying_price.tolist(),
+                                      revenue.tolist(), customer_id.tolist())))
+            conn.executemany('UPDATE inventory SET stock = stock - ?, last_updated = ? WHERE product = ?',
+                             list(zip(quantity.tolist(), [sale_date] * n, products)))
+            conn.executemany('UPDATE customers SET orders = orders + 1 WHERE id = ?',
+                             [(int(cid),) for cid in customer_id])
+        _clear_cached_data()
+        return True
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+        return False
+
+def _clear_cached_data():
+    # Writes touch sales, inventory and customers, so drop all three caches -
+    # including the analytics page's own cached copies, which are distinct
+    # functions when both pages run in one process under main_app.py
+    fetch_sales_data.clear()
+    fetch_inventory_data.clear()
+    fetch_customers.clear()
+    # Imported lazily so running this page standalone doesn't pull in plotly
+    import app
+    app.fetch_sales_data.clear()
+    app.fetch_inventory_data.clear()
+    app.fetch_customer_data.clear()
+    app.compute_metrics.clear()
+
 # --- Streamlit Interface ---
 def main():
     st.title("🛒 E-Commerce Business Management")
-    st.title("Business Management Platform")
 
-    # Initialize database
-    init_db()
+    # Initialize database (cached, so reruns skip the CREATE statements)
+    _ensure_schema()
 
     # Tabs for different management tasks
     tab1, tab2, tab3, tab4, tab5 = st.tabs(["Add Sale", "Update Inventory", "Manage Customers", "Import Data", "View Data"])
@@ -209,35 +332,42 @@ def main():
         st.write("Sales CSV format: product,quantity,selling_price,buying_price,customer_id")
         sales_file = st.file_uploader("Upload Sales CSV", type="csv", key="sales_csv_upload")
         if sales_file:
-            df = pd.read_csv(sales_file)
-            for _, row in df.iterrows():
-                if add_sale(row['product'], int(row['quantity']), float(row['selling_price']), float(row['buying_price']), int(row['customer_id'])):
-                    st.success(f"Sale for {row['product']} imported!")
-                else:
-                    st.error(f"Failed to import sale for {row['product']}.")
+            # Arrow's CSV reader plus explicit dtypes: no object columns, no
+            # per-cell coercion later in the import path
+            df = pd.read_csv(sales_file, engine='pyarrow',
+                             dtype={'product': 'string', 'quantity': 'int32',
+                                    'selling_price': 'float32', 'buying_price': 'float32',
+                                    'customer_id': 'int32'})
+            if bulk_add_sales(df):
+                st.success(f"Imported {len(df)} sales!")
+            else:
+                st.error("Failed to import sales CSV.")
 
         # Inventory CSV Import
         st.write("Inventory CSV format: product,stock,last_updated")
         inventory_file = st.file_uploader("Upload Inventory CSV", type="csv", key="inventory_csv_upload")
         if inventory_file:
-            df = pd.read_csv(inventory_file)
-            for _, row in df.iterrows():
-                if add_inventory(row['product'], int(row['stock']), row['last_updated']):
-                    st.success(f"Inventory for {row['product']} imported!")
-                else:
-                    st.error(f"Failed to import inventory for {row['product']}.")
+            df = pd.read_csv(inventory_file, engine='pyarrow',
+                             dtype={'product': 'string', 'stock': 'int32',
+                                    'last_updated': 'string'})
+            if bulk_add_inventory(df):
+                st.success(f"Imported inventory for {len(df)} products!")
+            else:
+                st.error("Failed to import inventory CSV.")
 
         # Customers CSV Import
         st.write("Customers CSV format: name,email,orders,is_active")
         customers_file = st.file_uploader("Upload Customers CSV", type="csv", key="customers_csv_upload")
         if customers_file:
-            df = pd.read_csv(customers_file)
-            for _, row in df.iterrows():
-                customer_id = add_customer(row['name'], row['email'], int(row['orders']), int(row['is_active']))
-                if customer_id:
-                    st.success(f"Customer {row['name']} imported with ID: {customer_id}")
-                else:
-                    st.error(f"Failed to import customer {row['name']}.")
+            df = pd.read_csv(customers_file, engine='pyarrow',
+                             dtype={'name': 'string', 'email': 'string',
+                                    'orders': 'int32', 'is_active': 'int32'})
+            imported = bulk_add_customers(df)
+            # None means failure; 0 is a legitimate empty import
+            if imported is not None:
+                st.success(f"Imported {imported} customers!")
+            else:
+                st.error("Failed to import customers CSV.")
 
     # Tab 5: View Data
     with tab5:
@@ -266,22 +396,8 @@ def main():
 
     # Simulate Business Activity
     if st.button("Simulate Daily Sales", key="simulate_sales"):
-        products = ['Phone', 'Tablet', 'TV', 'Appliance']
-        for product in products:
-            conn = sqlite3.connect('business_data.db')
-            c = conn.cursor()
-            c.execute('SELECT stock FROM inventory WHERE product = ?', (product,))
-            stock_result = c.fetchone()
-            if stock_result and stock_result[0] > 0:
-                quantity = random.randint(1, min(stock_result[0], 10))  # Limit to available stock
-                selling_price = random.uniform(5000, 50000)
-                buying_price = selling_price * random.uniform(0.6, 0.8)
-                customer_id = random.randint(1, 10)
-                if add_sale(product, quantity, selling_price, buying_price, customer_id):
-                    st.success(f"Simulated sale for {product} added!")
-            else:
-                st.warning(f"Skipping {product}: No stock available.")
-            conn.close()
+        if simulate_daily_sales():
+            st.success("Simulated daily sales added!")
 
 if __name__ == "__main__":
     main()
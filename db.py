@@ -0,0 +1,144 @@
+import sqlite3
+import threading
+import streamlit as st
+from contextlib import contextmanager
+from datetime import datetime
+
+DB_PATH = 'business_data.db'
+
+_lock = threading.Lock()
+_conn = None
+_write_lock = threading.Lock()
+
+@st.cache_resource(show_spinner=False)
+def get_conn():
+    """Return the shared SQLite connection, opening it on first use.
+
+    The connection is opened once per process and reused across Streamlit
+    reruns (via st.cache_resource) so the page cache stays warm instead of
+    paying the open/close cost on every query.
+    """
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+            _conn.execute('PRAGMA journal_mode=WAL')
+            _conn.execute('PRAGMA synchronous=NORMAL')
+            _conn.execute('PRAGMA cache_size=-65536')
+            _conn.execute('PRAGMA temp_store=MEMORY')
+            _conn.execute('PRAGMA foreign_keys=ON')
+    return _conn
+
+@contextmanager
+def transaction(conn=None):
+    """Run a BEGIN...COMMIT unit serialized against other writers.
+
+    Streamlit sessions run in separate threads but share the singleton
+    connection, so multi-statement transactions must not interleave: holding
+    the write lock for the whole unit keeps one thread's ROLLBACK from
+    destroying another's in-flight work. Commits on success, rolls back on
+    any exception and re-raises.
+    """
+    if conn is None:
+        conn = get_conn()
+    with _write_lock:
+        conn.execute('BEGIN')
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+
+def init_db():
+    """Create or migrate the schema shared by both pages.
+
+    Idempotent: safe to run on fresh and legacy databases alike. Each page
+    calls this once per process via its cached _ensure_schema wrapper.
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    # Sales table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sale_date TEXT,
+            product TEXT,
+            quantity INTEGER,
+            total_selling_price REAL,
+            total_buying_price REAL,
+            revenue REAL,
+            customer_id INTEGER,
+            FOREIGN KEY (customer_id) REFERENCES customers(id)
+        )
+    ''')
+    # Inventory table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS inventory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product TEXT,
+            stock INTEGER CHECK(stock >= 0),
+            last_updated TEXT
+        )
+    ''')
+    # Customers table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            email TEXT UNIQUE,
+            orders INTEGER,
+            is_active INTEGER
+        )
+    ''')
+    # Indexes for the lookups in add_sale and the dashboard aggregates
+    # (customers.email already gets an implicit index from its UNIQUE constraint)
+    # Databases from before the unique index may hold duplicate product rows
+    # (INSERT OR REPLACE never replaced without a uniqueness constraint);
+    # keep only the newest row per product so the index can be created
+    c.execute('DELETE FROM inventory WHERE id NOT IN (SELECT MAX(id) FROM inventory GROUP BY product)')
+    c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_inv_product ON inventory(product)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sales_product_date ON sales(product, sale_date)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales(customer_id)')
+    # Trigger-maintained rollups so the dashboard charts read O(groups) rows
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sales_by_product (
+            product TEXT PRIMARY KEY,
+            total_revenue REAL,
+            total_qty INTEGER
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sales_by_week (
+            week INTEGER PRIMARY KEY,
+            total_revenue REAL
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_agg AFTER INSERT ON sales
+        BEGIN
+            INSERT INTO sales_by_product (product, total_revenue, total_qty)
+            VALUES (NEW.product, NEW.revenue, NEW.quantity)
+            ON CONFLICT(product) DO UPDATE SET
+                total_revenue = total_revenue + NEW.revenue,
+                total_qty = total_qty + NEW.quantity;
+            INSERT INTO sales_by_week (week, total_revenue)
+            VALUES (CAST(strftime('%W', NEW.sale_date) AS INTEGER), NEW.revenue)
+            ON CONFLICT(week) DO UPDATE SET
+                total_revenue = total_revenue + NEW.revenue;
+        END
+    ''')
+    # Backfill the rollups for databases created before the trigger existed
+    if c.execute('SELECT 1 FROM sales_by_product LIMIT 1').fetchone() is None:
+        c.execute('INSERT INTO sales_by_product SELECT product, SUM(revenue), SUM(quantity) FROM sales GROUP BY product')
+        c.execute("INSERT INTO sales_by_week SELECT CAST(strftime('%W', sale_date) AS INTEGER), SUM(revenue) FROM sales GROUP BY 1")
+
+def now_str():
+    """Current timestamp in the 'YYYY-MM-DD HH:MM:SS' format the tables store.
+
+    isoformat with timespec is noticeably cheaper than strftime's format-string
+    parsing; callers should invoke this once per batch, not once per row.
+    """
+    return datetime.now().isoformat(sep=' ', timespec='seconds')